@@ -1,54 +1,178 @@
 """hooks, filters and commands"""
 
-import base64
+import functools
 import os
+import random
+import re
+import shutil
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from io import BytesIO
-from typing import Callable, Iterable, List, Tuple
+from itertools import zip_longest
+from typing import Callable, Dict, Iterator, List, Tuple, Type, TypeVar
 from urllib.parse import quote_plus
 
 import simplebot
-from cachelib import FileSystemCache
+from cachelib import BaseCache, FileSystemCache
 from deltachat import Message
 from requests import HTTPError
 from simplebot.bot import DeltaBot, Replies
 
+from .artifacts import ArtifactsCache
+from .jobs import JobQueue, QueueFullError
 from .manga_api import get_site, lang2sites
-from .manga_api.base import Chapter, Language, Manga, Site
+from .manga_api.base import Chapter, ChapterImage, Language, Manga, Site
+from .output import CbzPart, ChapterPart, HtmlPart, Page, PdfPart, split_pages
+from .store import SQLiteCache
+from .subscriptions import Subscriptions
 from .templates import get_template
-from .util import convert_image, getdefault, images2pdf
-
-cache: FileSystemCache = None  # noqa
+from .util import (
+    DailyQuota,
+    ImageProfile,
+    SingleFlight,
+    TokenBucket,
+    convert_image,
+    get_raw_page,
+    getdefault,
+    ordered_map,
+)
+
+T = TypeVar("T")
+
+cache: SQLiteCache = None  # noqa
 blobs_cache: FileSystemCache = None  # noqa
+pages_cache: FileSystemCache = None  # noqa
+artifacts: ArtifactsCache = None  # noqa
+jobs_dir: str = None  # noqa
+jobs: JobQueue = None  # noqa
+converter: ThreadPoolExecutor = None  # noqa
+writer: ThreadPoolExecutor = None  # noqa
+refresher: ThreadPoolExecutor = None  # noqa
+prefetch_bandwidth: TokenBucket = None  # noqa
+prefetch_quota: DailyQuota = None  # noqa
+subscriptions: Subscriptions = None  # noqa
+flight = SingleFlight()
 
 
 @simplebot.hookimpl
 def deltabot_init(bot: DeltaBot) -> None:
     pdf_max_size = getdefault(bot, "pdfMaxSize", str(1024**2 * 10))
     html_max_size = getdefault(bot, "htmlMaxSize", str(1024**2 * 10))
+    cbz_max_size = getdefault(bot, "cbzMaxSize", str(1024**2 * 10))
+    max_width = getdefault(bot, "imageMaxWidth", "1280")
+    quality = getdefault(bot, "imageQuality", "75")
+    grayscale = getdefault(bot, "imageGrayscale", "no")
+    img_max_size = getdefault(bot, "imageMaxSize", "0")
+    getdefault(bot, "downloadWorkers", "4")
+    getdefault(bot, "maxUserJobs", "3")
+    getdefault(bot, "convertWorkers", str(os.cpu_count() or 1))
+    getdefault(bot, "artifactsCacheSize", str(1024**3))
+    getdefault(bot, "searchTimeout", "20")
+    getdefault(bot, "prefetchChapters", "1")
+    getdefault(bot, "prefetchBandwidth", str(1024**2))
+    getdefault(bot, "prefetchDailySize", str(1024**3))
+    getdefault(bot, "maxSubscriptions", "50")
+    getdefault(bot, "subscriptionsInterval", str(60 * 60 * 6))
+    getdefault(bot, "subscriptionsSiteDelay", "30")
     bot.add_preference(
         "pdfMaxSize", f"PDF maximum size in bytes (default: {pdf_max_size})"
     )
     bot.add_preference(
         "htmlMaxSize", f"HTML-view maximum size in bytes (default: {html_max_size})"
     )
+    bot.add_preference(
+        "cbzMaxSize", f"CBZ maximum size in bytes (default: {cbz_max_size})"
+    )
+    bot.add_preference(
+        "imageMaxWidth",
+        f"Maximum width of the images in pixels, 0 for no limit (default: {max_width})",
+    )
+    bot.add_preference(
+        "imageQuality", f"JPEG quality of the images, 1-95 (default: {quality})"
+    )
+    bot.add_preference(
+        "imageGrayscale", f"Convert images to grayscale, yes/no (default: {grayscale})"
+    )
+    bot.add_preference(
+        "imageMaxSize",
+        "Size in bytes to fit each image in lowering its quality,"
+        f" 0 for no limit (default: {img_max_size})",
+    )
 
 
 @simplebot.hookimpl
 def deltabot_start(bot: DeltaBot) -> None:
-    global cache, blobs_cache  # noqa
+    global cache, blobs_cache, pages_cache, artifacts  # noqa
+    global jobs_dir, jobs, converter, writer, refresher  # noqa
+    global prefetch_bandwidth, prefetch_quota, subscriptions  # noqa
     plugin_dir = os.path.join(os.path.dirname(bot.account.db_path), __name__)
     if not os.path.exists(plugin_dir):
         os.makedirs(plugin_dir)
 
-    cache_dir = os.path.join(plugin_dir, "cache")
-    cache = FileSystemCache(cache_dir, threshold=0, default_timeout=60 * 60 * 24 * 60)
+    # remove old cache directory, replaced by the SQLite cache
+    shutil.rmtree(os.path.join(plugin_dir, "cache"), ignore_errors=True)
+    cache = SQLiteCache(
+        os.path.join(plugin_dir, "cache.db"), default_timeout=60 * 60 * 24 * 60
+    )
+    # saves cache entries that are not needed to reply the current request
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{__name__}-writer")
+    # updates expired cache entries while the old values are served
+    refresher = ThreadPoolExecutor(
+        max_workers=4, thread_name_prefix=f"{__name__}-refresher"
+    )
 
     blobs_cache_dir = os.path.join(plugin_dir, "blobs_cache")
     blobs_cache = FileSystemCache(
         blobs_cache_dir, threshold=9000, default_timeout=60 * 60 * 24 * 7  # 7days
     )
 
+    pages_cache_dir = os.path.join(plugin_dir, "pages_cache")
+    pages_cache = FileSystemCache(
+        pages_cache_dir, threshold=9000, default_timeout=60 * 60 * 24 * 7  # 7days
+    )
+
+    artifacts = ArtifactsCache(
+        os.path.join(plugin_dir, "artifacts"),
+        max_size=int(getdefault(bot, "artifactsCacheSize")),
+        max_age=60 * 60 * 24 * 7,  # 7days
+    )
+
+    # temporary files of the jobs, in the same filesystem as the artifacts cache
+    # so files can be hard-linked instead of copied
+    jobs_dir = os.path.join(plugin_dir, "tmp")
+    shutil.rmtree(jobs_dir, ignore_errors=True)
+    os.makedirs(jobs_dir)
+
+    jobs = JobQueue(
+        workers=int(getdefault(bot, "downloadWorkers")),
+        max_user_jobs=int(getdefault(bot, "maxUserJobs")),
+        logger=bot.logger,
+    )
+    jobs.start()
+
+    # Pillow releases the GIL while decoding/encoding so threads use all cores
+    converter = ThreadPoolExecutor(
+        max_workers=int(getdefault(bot, "convertWorkers")),
+        thread_name_prefix=f"{__name__}-converter",
+    )
+
+    # global limits of the chapters read-ahead so it doesn't compete with
+    # the users' requests for bandwidth and disk space
+    rate = int(getdefault(bot, "prefetchBandwidth"))
+    prefetch_bandwidth = TokenBucket(rate, burst=rate * 5)
+    prefetch_quota = DailyQuota(int(getdefault(bot, "prefetchDailySize")))
+
+    subscriptions = Subscriptions(os.path.join(plugin_dir, "subscriptions.db"))
+    threading.Thread(
+        target=_check_subscriptions,
+        args=(bot,),
+        name=f"{__name__}-subscriptions",
+        daemon=True,
+    ).start()
+
 
 @simplebot.filter
 def filter_messages(bot: DeltaBot, message: Message, replies: Replies) -> None:
@@ -83,14 +207,7 @@ def search(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> N
         assert site and lang in site.supported_languages
 
         try:
-            search_key = f"{lang_code}|{url}|{hash(query)}"
-            mangas = cache.get(search_key)
-            if mangas is None:
-                mangas = list(site.search(query, lang))
-                cache.set(search_key, mangas, timeout=60 * 60)
-                for manga in mangas:
-                    cache.set(manga.url, manga)
-
+            mangas = _search(site, lang, query)
             if mangas:
                 html = get_template("manga_list.j2").render(
                     bot_addr=bot.self_contact.addr,
@@ -111,6 +228,48 @@ def search(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> N
         replies.add(text="❌ Wrong usage", quote=message)
 
 
+@simplebot.command(hidden=True)
+def searchall(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> None:
+    """Search for mangas in all the sites of the given language."""
+    try:
+        lang_code, query = payload.split(maxsplit=1)
+        lang = Language[lang_code]
+        sites = lang2sites[lang]
+    except Exception as ex:
+        bot.logger.exception(ex)
+        replies.add(text="❌ Wrong usage", quote=message)
+        return
+
+    def job() -> None:
+        timeout = int(getdefault(bot, "searchTimeout"))
+        mangas, site_names, errors = _search_all(sites, lang, query, timeout)
+        if mangas:
+            html = get_template("manga_list.j2").render(
+                bot_addr=bot.self_contact.addr,
+                site_name=lang.value,
+                mangas=mangas,
+                site_names=site_names,
+                quote_plus=quote_plus,
+            )
+            text = f"{lang.value} Search Results"
+        else:
+            html = None
+            text = "❌ No matches found"
+        if errors:
+            text += "\n\n⚠️ Failed to search in:\n" + "\n".join(
+                f"{name}: {error}" for name, error in errors.items()
+            )
+        job_replies = Replies(message, logger=bot.logger)
+        job_replies.add(text=text, html=html, quote=message)
+        job_replies.send_reply_messages()
+
+    try:
+        position = jobs.put(message.get_sender_contact().addr, job)
+        replies.add(text=f"⏳ Request queued, position: {position}", quote=message)
+    except QueueFullError as ex:
+        replies.add(text=f"❌ {ex}", quote=message)
+
+
 @simplebot.command(hidden=True)
 def info(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> None:
     """Get the info and chapters list for the given manga."""
@@ -128,22 +287,20 @@ def info(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> Non
                 args["html"] = get_template("chapter_list.j2").render(
                     bot_addr=bot.self_contact.addr,
                     manga_name=manga.name,
+                    manga_url=manga.url,
+                    subscribed=subscriptions.is_subscribed(
+                        message.get_sender_contact().addr, manga.url
+                    ),
                     chapters=chapters,
                     quote_plus=quote_plus,
                 )
             args["text"] = f"{manga.name}\n{manga.url}\n\n({len(chapters)} chapters)"
             if manga.cover:
-                cover_bytes = blobs_cache.get(manga.cover)
-                if not cover_bytes:
-                    try:
-                        cover_bytes = site.download_cover(manga)
-                        blobs_cache.set(manga.cover, cover_bytes)
-                    except HTTPError as ex:
-                        bot.logger.exception(ex)
-
-                if cover_bytes:
+                try:
+                    args["bytefile"] = _get_cover(site, manga)
                     args["filename"] = "cover.jpg"
-                    args["bytefile"] = convert_image(cover_bytes)[0]
+                except HTTPError as ex:
+                    bot.logger.exception(ex)
             replies.add(**args)
         except Exception as ex:
             bot.logger.exception(ex)
@@ -153,6 +310,67 @@ def info(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> Non
         replies.add(text="❌ Wrong usage", quote=message)
 
 
+@simplebot.command(hidden=True)
+def subscribe(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> None:
+    """Get notified when new chapters of the given manga are released."""
+    site = get_site(payload)
+    if not site:
+        replies.add(text="❌ Wrong usage", quote=message)
+        return
+    addr = message.get_sender_contact().addr
+    max_subscriptions = int(getdefault(bot, "maxSubscriptions"))
+    if len(subscriptions.get_mangas(addr)) >= max_subscriptions:
+        replies.add(
+            text=f"❌ You can't have more than {max_subscriptions} subscriptions",
+            quote=message,
+        )
+        return
+
+    manga = cache.get(payload) or Manga(url=payload)
+    saved = cache.get(f"chapters|{manga.url}")
+    if saved:
+        chapters = [chapter.url for chapter in saved[2]]
+        # spread the checks of new subscriptions over the checking interval
+        interval = int(getdefault(bot, "subscriptionsInterval"))
+        next_check = time.time() + random.uniform(0, interval)
+    else:  # don't scrape the site here, the first check gets the chapters
+        chapters = []
+        next_check = time.time()
+    name = manga.name or manga.url
+    if subscriptions.subscribe(addr, manga.url, name, chapters, next_check):
+        replies.add(text=f"🔔 Subscribed to {name}", quote=message)
+    else:
+        replies.add(text=f"❌ You are already subscribed to {name}", quote=message)
+
+
+@simplebot.command(hidden=True)
+def unsubscribe(payload: str, message: Message, replies: Replies) -> None:
+    """Stop getting notifications of new chapters of the given manga."""
+    if subscriptions.unsubscribe(message.get_sender_contact().addr, payload):
+        replies.add(text="🔕 Unsubscribed", quote=message)
+    else:
+        replies.add(text="❌ You are not subscribed to that manga", quote=message)
+
+
+@simplebot.command(name="/subscriptions")
+def subscriptions_cmd(bot: DeltaBot, message: Message, replies: Replies) -> None:
+    """Show the mangas you are subscribed to."""
+    mangas = [
+        Manga(url=url, name=name)
+        for url, name in subscriptions.get_mangas(message.get_sender_contact().addr)
+    ]
+    if mangas:
+        html = get_template("manga_list.j2").render(
+            bot_addr=bot.self_contact.addr,
+            site_name="🔔 Subscriptions",
+            mangas=mangas,
+            quote_plus=quote_plus,
+        )
+        replies.add(text=f"🔔 Subscriptions ({len(mangas)})", html=html, quote=message)
+    else:
+        replies.add(text="❌ You have no subscriptions", quote=message)
+
+
 @simplebot.command(hidden=True)
 def read(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> None:
     """Read the given manga chapter."""
@@ -160,7 +378,8 @@ def read(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> Non
         bot.get("htmlMaxSize", scope=message.get_sender_contact().addr)
         or getdefault(bot, "htmlMaxSize")
     )
-    _download(bot, payload, message, replies, _send_html, max_size)
+    profile = _get_profile(bot, message.get_sender_contact().addr)
+    _queue_download(bot, payload, message, replies, HtmlPart, max_size, profile)
 
 
 @simplebot.command(hidden=True)
@@ -170,7 +389,74 @@ def download(bot: DeltaBot, payload: str, message: Message, replies: Replies) ->
         bot.get("pdfMaxSize", scope=message.get_sender_contact().addr)
         or getdefault(bot, "pdfMaxSize")
     )
-    _download(bot, payload, message, replies, _send_pdf, max_size)
+    profile = _get_profile(bot, message.get_sender_contact().addr)
+    _queue_download(bot, payload, message, replies, PdfPart, max_size, profile)
+
+
+@simplebot.command(hidden=True)
+def cbz(bot: DeltaBot, payload: str, message: Message, replies: Replies) -> None:
+    """Download the given manga chapter as comic book archive."""
+    max_size = int(
+        bot.get("cbzMaxSize", scope=message.get_sender_contact().addr)
+        or getdefault(bot, "cbzMaxSize")
+    )
+    profile = _get_profile(bot, message.get_sender_contact().addr)
+    _queue_download(bot, payload, message, replies, CbzPart, max_size, profile)
+
+
+def _get_profile(bot: DeltaBot, addr: str) -> ImageProfile:
+    """Get the images settings of the given user."""
+
+    def get(key: str) -> str:
+        return bot.get(key, scope=addr) or getdefault(bot, key)
+
+    return ImageProfile(
+        max_width=int(get("imageMaxWidth")),
+        quality=min(max(int(get("imageQuality")), 1), 95),
+        grayscale=get("imageGrayscale").lower() == "yes",
+        max_size=int(get("imageMaxSize")),
+    )
+
+
+def _queue_download(
+    bot: DeltaBot,
+    payload: str,
+    message: Message,
+    replies: Replies,
+    part_class: Type[ChapterPart],
+    max_size: int,
+    profile: ImageProfile,
+) -> None:
+    if not get_site(payload):
+        replies.add(text="❌ Wrong usage", quote=message)
+        return
+
+    def job() -> None:
+        with tempfile.TemporaryDirectory(dir=jobs_dir) as tmp_dir:
+            job_replies = Replies(message, logger=bot.logger)
+            _download(
+                bot,
+                payload,
+                message,
+                job_replies,
+                part_class,
+                max_size,
+                profile,
+                tmp_dir,
+            )
+            job_replies.send_reply_messages()
+        count = int(getdefault(bot, "prefetchChapters"))
+        if count > 0:
+            prefetch = functools.partial(
+                _prefetch, bot, payload, count, profile, part_class.convert
+            )
+            jobs.put_background((payload, profile, part_class.convert), prefetch)
+
+    try:
+        position = jobs.put(message.get_sender_contact().addr, job)
+        replies.add(text=f"⏳ Request queued, position: {position}", quote=message)
+    except QueueFullError as ex:
+        replies.add(text=f"❌ {ex}", quote=message)
 
 
 def _download(
@@ -178,8 +464,10 @@ def _download(
     payload: str,
     message: Message,
     replies: Replies,
-    send_part: Callable,
+    part_class: Type[ChapterPart],
     max_size: int,
+    profile: ImageProfile,
+    tmp_dir: str,
 ) -> None:
     try:
         site = get_site(payload)
@@ -189,20 +477,21 @@ def _download(
             chapter = Chapter(url=payload)
 
         try:
-            imgs: List[Tuple[BytesIO, int, int]] = []
-            size = 0
-            part = 0
-            for img_bytes in _get_images(site, chapter):
-                if size >= max_size:
-                    part += 1
-                    send_part(imgs, part, chapter, replies)
-                    imgs, size = [], 0
-                img = convert_image(img_bytes)
-                size += img[0].getbuffer().nbytes
-                imgs.append(img)
-            if part > 0:
-                part += 1
-            send_part(imgs, part, chapter, replies)
+            key = f"{part_class.filename}|{max_size}|{profile.key}|{chapter.url}"
+            files = artifacts.get(key, tmp_dir)
+            if files is None:
+                files = _build_parts(
+                    site, chapter, part_class, max_size, profile, tmp_dir
+                )
+                artifacts.set(key, files)
+            for i, path in enumerate(files):
+                number = i + 1 if len(files) > 1 else 0
+                title = f"{chapter.name} (Part {number})" if number else chapter.name
+                replies.add(
+                    text=f"{title}\n{chapter.url}",
+                    sender=title,
+                    **part_class.reply_args(path),
+                )
         except Exception as ex:
             bot.logger.exception(ex)
             replies.add(text=f"❌ Error: {ex}", quote=message)
@@ -211,62 +500,403 @@ def _download(
         replies.add(text="❌ Wrong usage", quote=message)
 
 
-def _get_images(site: Site, chapter: Chapter) -> Iterable[bytes]:
-    imgs_key = f"imgs|{chapter.url}"
-    imgs = cache.get(imgs_key)
-    if not imgs:
-        imgs = list(site.get_images(chapter))
-        cache.set(imgs_key, imgs, timeout=60 * 60)
-
-    for img in imgs:
-        img_bytes = blobs_cache.get(img.url)
-        if not img_bytes:
-            img_bytes = site.download_image(img)
-            blobs_cache.set(img.url, img_bytes)
-            time.sleep(0.1)
-        yield img_bytes
+def _search(site: Site, lang: Language, query: str) -> List[Manga]:
+    def fetch() -> List[Manga]:
+        mangas = list(site.search(query, lang))
+        writer.submit(cache.set_many, {manga.url: manga for manga in mangas})
+        return mangas
 
+    search_key = f"search|{lang.name}|{site.url}|{query}"
+    return _revalidated(search_key, fetch, max_age=60 * 60, max_stale=60 * 60 * 24)
 
-def _get_chapters(site: Site, manga: Manga) -> List[Chapter]:
-    chapters_key = f"chaps|{manga.url}"
-    chapters = cache.get(chapters_key)
-    if not chapters:
-        chapters = list(site.get_chapters(manga))
-        cache.set(chapters_key, chapters, timeout=60 * 60)
-        for chapter in chapters:
-            cache.set(chapter.url, chapter)
-    return chapters
 
+def _search_all(
+    sites: List[Site], lang: Language, query: str, timeout: float
+) -> Tuple[List[Manga], Dict[str, str], Dict[str, str]]:
+    """Search in all the given sites at the same time.
 
-def _send_pdf(
-    imgs: List[Tuple[BytesIO, int, int]], part: int, chapter: Chapter, replies: Replies
+    Return the merged results without duplicated titles, the site name of each
+    manga URL and the error of each site that failed or didn't reply in time.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(sites))
+    futures = {pool.submit(_search, site, lang, query): site for site in sites}
+    # don't wait for slow sites, their results will be cached when they finish
+    pool.shutdown(wait=False)
+    done, _ = wait(futures, timeout=timeout)
+
+    results: List[List[Manga]] = []
+    site_names: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    for future, site in futures.items():
+        if future not in done:
+            errors[site.name] = "timed out"
+        elif future.exception():
+            errors[site.name] = str(future.exception())
+        else:
+            results.append(future.result())
+            for manga in results[-1]:
+                site_names[manga.url] = site.name
+
+    # interleave the results so the best matches of every site come first
+    mangas = []
+    seen = set()
+    for group in zip_longest(*results):
+        for manga in filter(None, group):
+            title = " ".join(re.findall(r"\w+", manga.name.casefold()))
+            if title not in seen:
+                seen.add(title)
+                mangas.append(manga)
+    return mangas, site_names, errors
+
+
+def _prefetch(
+    bot: DeltaBot, chapter_url: str, count: int, profile: ImageProfile, convert: bool
 ) -> None:
-    title = f"{chapter.name or chapter.url}"
-    if part > 0:
-        title += f" (Part {part})"
-    pdf = images2pdf(imgs, title)
-    title = f"{chapter.name} (Part {part})" if part > 0 else chapter.name
-    replies.add(
-        text=f"{title}\n{chapter.url}",
-        sender=title,
-        filename="chapter.pdf",
-        bytefile=pdf,
+    """Download and convert the images of the chapters after the given one.
+
+    If ``convert`` is False the images are only downloaded. The downloads are
+    done one at a time, sharing a global bandwidth limit and daily quota.
+    """
+    site = get_site(chapter_url)
+    manga_url = cache.get(f"manga|{chapter_url}")
+    if not site or not manga_url:
+        return
+    manga = cache.get(manga_url) or Manga(url=manga_url)
+    chapters = [chapter.url for chapter in _get_chapters(site, manga)]
+    if chapter_url not in chapters:
+        return
+    # the chapters are listed from newest to oldest
+    index = chapters.index(chapter_url)
+    for url in reversed(chapters[max(index - count, 0) : index]):
+        chapter = cache.get(url) or Chapter(url=url)
+        for img in _get_images(site, chapter):
+            if convert:
+                cached = pages_cache.has(f"pages|{profile.key}|{img.url}")
+            else:
+                cached = blobs_cache.has(img.url)
+            if cached:
+                continue
+            if prefetch_quota.exceeded():
+                bot.logger.debug("Prefetch daily quota exceeded")
+                return
+            downloaded = not blobs_cache.has(img.url)
+            img_bytes = _get_image(site, img)
+            if downloaded:
+                prefetch_quota.add(len(img_bytes))
+                prefetch_bandwidth.consume(len(img_bytes))
+            if convert:
+                _get_converted(img.url, lambda data=img_bytes: data, profile)
+
+
+def _get_images(site: Site, chapter: Chapter) -> List[ChapterImage]:
+    # image links may be temporary, don't use them for too long
+    return _revalidated(
+        f"images|{chapter.url}",
+        lambda: site.resolve_images(list(site.get_images(chapter))),
+        max_age=60 * 60,
+        max_stale=60 * 60 * 6,
     )
 
 
-def _send_html(
-    imgs: List[Tuple[BytesIO, int, int]], part: int, chapter: Chapter, replies: Replies
+def _get_pages(
+    site: Site, chapter: Chapter, profile: ImageProfile, convert: bool = True
+) -> Iterator[Page]:
+    """Get the chapter's pages.
+
+    :param convert: if False, images in formats supported by comic book readers
+                    are returned as-is.
+    """
+    imgs = _get_images(site, chapter)
+
+    # the fetching threads also wait for the converter, use some extra threads
+    # so the site's connections are kept busy meanwhile
+    workers = site.max_connections * 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        get_pages = functools.partial(
+            _get_image_pages if convert else _get_raw_pages, site, profile
+        )
+        for pages in ordered_map(get_pages, imgs, pool, prefetch=workers):
+            yield from pages
+
+
+def _get_image_pages(
+    site: Site, profile: ImageProfile, img: ChapterImage
+) -> List[Page]:
+    get_bytes = functools.partial(_get_image, site, img)
+    return _get_converted(img.url, get_bytes, profile)
+
+
+def _get_raw_pages(site: Site, profile: ImageProfile, img: ChapterImage) -> List[Page]:
+    img_bytes = _get_image(site, img)
+    page = get_raw_page(img_bytes)
+    if page:
+        return [page]
+    return _get_converted(img.url, lambda: img_bytes, profile)
+
+
+def _get_image(site: Site, img: ChapterImage) -> bytes:
+    def fetch() -> bytes:
+        with site.throttle():
+            return site.download_image(img)
+
+    return _cached(blobs_cache, img.url, fetch)
+
+
+def _get_cover(site: Site, manga: Manga) -> BytesIO:
+    assert manga.cover
+    url: str = manga.cover
+
+    def get_bytes() -> bytes:
+        return _cached(blobs_cache, url, lambda: site.download_cover(manga))
+
+    return _get_converted(url, get_bytes, ImageProfile())[0][0]
+
+
+def _get_converted(
+    url: str, get_bytes: Callable[[], bytes], profile: ImageProfile
+) -> List[Page]:
+    """Get the pages of the given URL's image from cache or convert it."""
+
+    def convert() -> List[Tuple[bytes, int, int]]:
+        future = converter.submit(convert_image, get_bytes(), profile)
+        return [
+            (img_file.getvalue(), width, height)
+            for img_file, width, height in future.result()
+        ]
+
+    pages = _cached(pages_cache, f"pages|{profile.key}|{url}", convert)
+    return [(BytesIO(data), width, height) for data, width, height in pages]
+
+
+def _check_subscriptions(bot: DeltaBot) -> None:
+    """Check the subscribed mangas for new chapters forever.
+
+    Each manga is checked once per interval no matter how many subscribers it
+    has, and the checks of mangas from the same site are spaced in time.
+    """
+    interval = int(getdefault(bot, "subscriptionsInterval"))
+    site_delay = int(getdefault(bot, "subscriptionsSiteDelay"))
+    next_request: Dict[str, float] = {}  # site URL -> time of its next check
+    while True:
+        try:
+            now = time.time()
+            for url, name in subscriptions.get_due(now):
+                site = get_site(url)
+                if site and next_request.get(site.url, 0) > now:
+                    continue
+                # jitter to avoid checking the same mangas always at the same time
+                next_check = now + interval * random.uniform(0.9, 1.1)
+                if not site:  # site no longer supported
+                    subscriptions.postpone(url, next_check)
+                    continue
+                next_request[site.url] = now + site_delay * random.uniform(1, 1.5)
+                try:
+                    _check_manga(bot, site, url, name, next_check)
+                except Exception as ex:
+                    bot.logger.exception(ex)
+                    subscriptions.postpone(url, next_check)
+                break
+            else:
+                time.sleep(5)
+        except Exception as ex:
+            bot.logger.exception(ex)
+            time.sleep(5)
+
+
+def _check_manga(
+    bot: DeltaBot, site: Site, url: str, name: str, next_check: float
 ) -> None:
-    html = (
-        '<!DOCTYPE html><html><meta charset="UTF-8">'
-        '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
-        "<style>html,body{padding:0;margin:0;}img{width:100%;height:auto;}</style>"
-        "</head><body>"
+    manga = cache.get(url) or Manga(url=url, name=name)
+    chapters = _get_chapters(site, manga, refresh=True)
+    known = subscriptions.get_chapters(url)
+    new_chapters = [chapter for chapter in chapters if chapter.url not in known]
+    if new_chapters and known:
+        html = get_template("chapter_list.j2").render(
+            bot_addr=bot.self_contact.addr,
+            manga_name=name,
+            manga_url=url,
+            subscribed=True,
+            chapters=new_chapters,
+            quote_plus=quote_plus,
+        )
+        text = f"🔔 {name}\n{url}\n\n({len(new_chapters)} new chapters)"
+        for addr in subscriptions.get_subscribers(url):
+            try:
+                _notify(bot, addr, text, html)
+            except Exception as ex:
+                bot.logger.exception(ex)
+    # keep the old chapters too, so they aren't notified again if the site
+    # temporarily returns an incomplete list
+    subscriptions.update(
+        url, known + [chapter.url for chapter in new_chapters], next_check
     )
-    for img_file, _, _ in imgs:
-        img = base64.b64encode(img_file.read()).decode()
-        html += f'<img src="data:image/jpeg;base64,{img}"/>'
-        img_file.close()
-    html += "</body></html>"
-    title = f"{chapter.name} (Part {part})" if part > 0 else chapter.name
-    replies.add(text=f"{title}\n{chapter.url}", sender=title, html=html)
+
+
+def _notify(bot: DeltaBot, addr: str, text: str, html: str) -> None:
+    """Send a message with the given text and HTML to the given user."""
+    msg = Message.new_empty(bot.account, "text")
+    msg.set_text(text)
+    msg.set_html(html)
+    bot.get_chat(addr).send_msg(msg)
+
+
+def _get_chapters(site: Site, manga: Manga, refresh: bool = False) -> List[Chapter]:
+    """Get the manga's chapters, updating the saved list if it is old.
+
+    Usually only the newest chapters are fetched from the site to update the
+    list, the whole list is fetched again once a day to catch other changes.
+
+    Lists older than an hour are returned as-is while they are updated in
+    background, unless they are older than a day.
+
+    :param refresh: update the list even if it is recent.
+    """
+    key = f"chapters|{manga.url}"
+
+    def update() -> List[Chapter]:
+        _, synced_at, saved_chapters = cache.get(key) or (0.0, 0.0, [])
+        now = time.time()
+        if now - synced_at < 60 * 60 * 24:
+            new_chapters, chapters = _get_new_chapters(site, manga, saved_chapters)
+        else:
+            new_chapters = chapters = list(site.get_chapters(manga))
+            synced_at = now
+        if not chapters and saved_chapters:
+            # some sites return an empty list instead of failing, keep the old one
+            raise ValueError(f"No chapters found in {manga.url}")
+        cache.set(key, (now, synced_at, chapters))
+
+        mapping: Dict[str, object] = {chapter.url: chapter for chapter in new_chapters}
+        # to find the chapter's manga when reading ahead
+        mapping.update({f"manga|{chapter.url}": manga.url for chapter in new_chapters})
+        writer.submit(cache.set_many, mapping)
+        return chapters
+
+    saved = cache.get(key)
+    if saved and not refresh:
+        checked_at, _, chapters = saved
+        age = time.time() - checked_at
+        if age < 60 * 60:
+            return chapters
+        if age < 60 * 60 * 24:
+            flight.start((id(cache), key), update, refresher)
+            return chapters
+    return flight.do((id(cache), key), update)
+
+
+def _get_new_chapters(
+    site: Site, manga: Manga, chapters: List[Chapter]
+) -> Tuple[List[Chapter], List[Chapter]]:
+    """Get the chapters newer than the given list of known chapters.
+
+    The site's chapters are fetched from newest to oldest until a known chapter
+    is found. Return the new chapters and the updated list of chapters.
+    """
+    known = {chapter.url for chapter in chapters}
+    new_chapters = []
+    for chapter in site.get_chapters(manga):
+        if chapter.url in known:
+            break
+        new_chapters.append(chapter)
+    else:  # the known chapters are gone, replace them
+        return new_chapters, new_chapters
+    return new_chapters, new_chapters + chapters
+
+
+def _revalidated(key: str, fetch: Callable[[], T], max_age: int, max_stale: int) -> T:
+    """Get the given key's value from cache or fetch it and save it in cache.
+
+    Values older than ``max_age`` seconds are returned while they are fetched
+    again in background, if that fails the old value is kept until it is
+    ``max_stale`` seconds old.
+    """
+
+    def update() -> T:
+        value = fetch()
+        cache.set(key, (time.time(), value), timeout=max_stale)
+        return value
+
+    saved = cache.get(key)
+    if saved is None:
+        return flight.do((id(cache), key), update)
+    fetched_at, value = saved
+    if time.time() - fetched_at >= max_age:
+        flight.start((id(cache), key), update, refresher)
+    return value
+
+
+def _cached(cache_: BaseCache, key: str, fetch: Callable[[], T], **kwargs) -> T:
+    """Get the given key's value from cache or fetch it and save it in cache.
+
+    Concurrent calls with the same key share a single fetch.
+    """
+
+    def get() -> T:
+        value = cache_.get(key)
+        if value is None:
+            value = fetch()
+            cache_.set(key, value, **kwargs)
+        return value
+
+    return flight.do((id(cache_), key), get)
+
+
+def _build_parts(
+    site: Site,
+    chapter: Chapter,
+    part_class: Type[ChapterPart],
+    max_size: int,
+    profile: ImageProfile,
+    tmp_dir: str,
+) -> List[str]:
+    """Build the chapter's files, split in parts not bigger than ``max_size``.
+
+    The pages are saved to disk first so the parts can be planned knowing the
+    size of all the pages, parts that are still too big are split again.
+    """
+    pages = _spool_pages(site, chapter, profile, part_class.convert, tmp_dir)
+    assert pages, "No images found"
+    sizes = [part_class.page_size(os.path.getsize(page[0])) for page in pages]
+    pending = deque(split_pages(sizes, max_size, part_class.base_size))
+    files: List[str] = []
+    while pending:
+        indexes = pending.popleft()
+        part = part_class(tempfile.mkdtemp(dir=tmp_dir))
+        for i in indexes:
+            path, width, height = pages[i]
+            with open(path, "rb") as file:
+                part.add((BytesIO(file.read()), width, height))
+        number = len(files) + 1 if files or pending else 0
+        path = _close_part(part, number, chapter)
+        if len(indexes) > 1 and os.path.getsize(path) > max_size:
+            shutil.rmtree(part.dirname)
+            half_size = sum(sizes[i] for i in indexes) // 2 + part_class.base_size
+            parts = split_pages([sizes[i] for i in indexes], half_size, 0)
+            pending.extendleft(
+                reversed([[indexes[i] for i in group] for group in parts])
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def _spool_pages(
+    site: Site, chapter: Chapter, profile: ImageProfile, convert: bool, tmp_dir: str
+) -> List[Tuple[str, int, int]]:
+    """Save the chapter's pages to disk, return their path and dimensions."""
+    pages_dir = tempfile.mkdtemp(dir=tmp_dir)
+    pages = []
+    pages_iter = _get_pages(site, chapter, profile, convert)
+    for i, (img_file, width, height) in enumerate(pages_iter):
+        path = os.path.join(pages_dir, f"{i}.jpg")
+        with img_file, open(path, "wb") as file:
+            file.write(img_file.getvalue())
+        pages.append((path, width, height))
+    return pages
+
+
+def _close_part(part: ChapterPart, number: int, chapter: Chapter) -> str:
+    title = f"{chapter.name or chapter.url}"
+    if number > 0:
+        title += f" (Part {number})"
+    return part.close(title)
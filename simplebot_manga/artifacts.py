@@ -0,0 +1,123 @@
+"""Cache of finished chapter files"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class ArtifactsCache:
+    """Disk cache of the files of finished chapters.
+
+    Each entry is a list of files, stored in a directory named after the hash of
+    the entry's key. Least recently used entries are removed when the cache
+    exceeds the maximum size, entries older than ``max_age`` seconds are
+    ignored and removed when requested.
+    """
+
+    def __init__(self, dirname: str, max_size: int, max_age: float) -> None:
+        self.dirname = dirname
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # name -> (size, creation time)
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._size = 0
+
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        entries = []
+        for name in os.listdir(dirname):
+            path = os.path.join(dirname, name)
+            if "." in name:  # unfinished entry
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                entries.append((os.path.getmtime(path), name, _get_size(path)))
+        for mtime, name, size in sorted(entries):
+            self._entries[name] = (size, mtime)
+            self._size += size
+
+    def get(self, key: str, dest: str) -> Optional[List[str]]:
+        """Get the files of the given entry.
+
+        The files are linked (or copied) to the given directory, so they are not
+        affected if the entry is removed later, the list of new paths is returned.
+        """
+        name = _get_name(key)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if self._is_expired(name):
+                self._remove(name)
+                return None
+            self._entries.move_to_end(name)
+            return _link_files(os.path.join(self.dirname, name), dest)
+
+    def set(self, key: str, files: List[str]) -> None:
+        """Store a copy of the given files under the given key."""
+        name = _get_name(key)
+        tmp_path = tempfile.mkdtemp(prefix=f"{name}.", dir=self.dirname)
+        try:
+            for i, filename in enumerate(files):
+                part_dir = os.path.join(tmp_path, str(i))
+                os.mkdir(part_dir)
+                _link(filename, os.path.join(part_dir, os.path.basename(filename)))
+            size = _get_size(tmp_path)
+            with self._lock:
+                if name in self._entries and self._is_expired(name):
+                    self._remove(name)
+                if name in self._entries or size > self.max_size:
+                    return
+                path = os.path.join(self.dirname, name)
+                os.rename(tmp_path, path)
+                self._entries[name] = (size, os.path.getmtime(path))
+                self._size += size
+                self._evict()
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _is_expired(self, name: str) -> bool:
+        return time.time() - self._entries[name][1] > self.max_age
+
+    def _remove(self, name: str) -> None:
+        size, _ = self._entries.pop(name)
+        shutil.rmtree(os.path.join(self.dirname, name), ignore_errors=True)
+        self._size -= size
+
+    def _evict(self) -> None:
+        while self._size > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+
+def _get_name(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _get_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+def _link_files(path: str, dest: str) -> List[str]:
+    files = []
+    for part in sorted(os.listdir(path), key=int):
+        part_dir = os.path.join(path, part)
+        name = os.listdir(part_dir)[0]
+        part_dest = tempfile.mkdtemp(dir=dest)
+        files.append(os.path.join(part_dest, name))
+        _link(os.path.join(part_dir, name), files[-1])
+    return files
+
+
+def _link(src: str, dest: str) -> None:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
@@ -0,0 +1,130 @@
+"""Background jobs queue"""
+
+import threading
+from collections import OrderedDict, deque
+from logging import Logger
+from typing import Callable, Deque, Dict, Hashable, Tuple
+
+Job = Callable[[], None]
+
+
+class QueueFullError(Exception):
+    """The user already has the maximum number of jobs allowed in the queue."""
+
+
+class JobQueue:
+    """Queue of jobs processed in background by a pool of worker threads.
+
+    Jobs are grouped per user and the users are served in round-robin, so
+    someone requesting lots of chapters doesn't delay the requests of others.
+
+    Low priority background jobs are run one at a time by a thread of their
+    own, outside the pool, so they never delay the user jobs.
+    """
+
+    #: maximum number of background jobs waiting, the oldest ones are dropped
+    max_background_jobs = 100
+
+    def __init__(self, workers: int, max_user_jobs: int, logger: Logger) -> None:
+        self.workers = workers
+        self.max_user_jobs = max_user_jobs
+        self.logger = logger
+        # users waiting for their turn, in round-robin order
+        self._queues: Dict[str, Deque[Job]] = OrderedDict()
+        # number of queued and running jobs of each user
+        self._jobs_count: Dict[str, int] = {}
+        self._background: Dict[Hashable, Job] = OrderedDict()
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        # only the background thread waits on this one
+        self._background_cond = threading.Condition(lock)
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            threading.Thread(
+                target=self._worker, name=f"{__name__}-{i}", daemon=True
+            ).start()
+        threading.Thread(
+            target=self._background_worker, name=f"{__name__}-bg", daemon=True
+        ).start()
+
+    def put(self, user: str, job: Job) -> int:
+        """Add a job to the given user's queue.
+
+        Return the job position in the global queue, starting at 1.
+        """
+        with self._cond:
+            if self._jobs_count.get(user, 0) >= self.max_user_jobs:
+                raise QueueFullError(
+                    f"You can't have more than {self.max_user_jobs} pending requests"
+                )
+            self._jobs_count[user] = self._jobs_count.get(user, 0) + 1
+            queue = self._queues.setdefault(user, deque())
+            queue.append(job)
+
+            turns = len(queue)
+            position = 0
+            before = True
+            for user2, queue2 in self._queues.items():
+                if user2 == user:
+                    before = False
+                    position += turns
+                else:
+                    position += min(len(queue2), turns if before else turns - 1)
+
+            self._cond.notify()
+            return position
+
+    def put_background(self, key: Hashable, job: Job) -> None:
+        """Add a low priority job to the queue.
+
+        The job is ignored if there is already a job with the same key waiting.
+        """
+        with self._cond:
+            if key in self._background:
+                return
+            self._background[key] = job
+            while len(self._background) > self.max_background_jobs:
+                self._background.pop(next(iter(self._background)))
+            self._background_cond.notify()
+
+    def _get(self) -> Tuple[str, Job]:
+        with self._cond:
+            while not self._queues:
+                self._cond.wait()
+            user, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            del self._queues[user]
+            if queue:  # move the user to the end of the round
+                self._queues[user] = queue
+            return user, job
+
+    def _get_background(self) -> Job:
+        with self._cond:
+            while not self._background:
+                self._background_cond.wait()
+            return self._background.pop(next(iter(self._background)))
+
+    def _done(self, user: str) -> None:
+        with self._cond:
+            self._jobs_count[user] -= 1
+            if not self._jobs_count[user]:
+                del self._jobs_count[user]
+
+    def _worker(self) -> None:
+        while True:
+            user, job = self._get()
+            try:
+                job()
+            except Exception as ex:
+                self.logger.exception(ex)
+            finally:
+                self._done(user)
+
+    def _background_worker(self) -> None:
+        while True:
+            job = self._get_background()
+            try:
+                job()
+            except Exception as ex:
+                self.logger.exception(ex)
@@ -2,8 +2,6 @@
 
 from typing import Iterable, Set
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
@@ -23,7 +21,7 @@ class AsuraScans(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(self.url, params={"s": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="listupd")
         soup = soup.find("div", {"class": "listupd"})
         cards = soup("div", {"class": "bs"})
         anchors = [card.findNext("a") for card in cards]
@@ -38,7 +36,7 @@ class AsuraScans(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", id="chapterlist")
         anchors = [
             li.findNext("a") for li in soup.find("div", {"id": "chapterlist"})("li")
         ]
@@ -49,7 +47,7 @@ class AsuraScans(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", id="readerarea")
         soup = soup.find("div", {"id": "readerarea"})
         for tag in soup("p"):
             yield ChapterImage(url=tag.findNext("img")["src"])
@@ -3,21 +3,43 @@
 
 import base64
 import functools
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
-from typing import Iterable, Optional, Set
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+from bs4 import BeautifulSoup, SoupStrainer
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-_session = Session()
-_session.headers.update(
-    {
-        "User-Agent": (
-            "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:104.0) Gecko/20100101 Firefox/104.0"
-        )
-    }
+try:
+    import lxml  # noqa
+
+    _PARSER = "lxml"
+except ImportError:
+    _PARSER = "html.parser"
+
+T = TypeVar("T")
+R = TypeVar("R")
+_USER_AGENT = (
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:104.0) Gecko/20100101 Firefox/104.0"
 )
-_session.request = functools.partial(_session.request, timeout=30)  # type: ignore
 
 
 class Language(Enum):
@@ -51,7 +73,21 @@ class ChapterImage:
 class Site(ABC):
     """Abstract class base of all manga sites."""
 
-    session = _session
+    #: maximum number of simultaneous downloads from the site
+    max_connections = 4
+    #: politeness delay in seconds after each download
+    request_delay = 0.1
+    #: connect and read timeouts in seconds
+    timeout: Tuple[float, float] = (10, 30)
+    #: how many times failed requests are retried, with exponential backoff
+    retries = 3
+    #: default headers sent in all the requests to the site
+    headers: Dict[str, str] = {}
+
+    def __init__(self) -> None:
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._adapter = self._new_adapter()
+        self.session = self.new_session()
 
     @property
     @abstractmethod
@@ -83,6 +119,15 @@ class Site(ABC):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         """Get the images from a chapter."""
 
+    def resolve_images(self, images: List[ChapterImage]) -> List[ChapterImage]:
+        """Get the direct links of the given chapter images.
+
+        Sites that have an HTML page per image instead of linking the images
+        directly override this to get the images' URLs from all the pages at
+        once, so the images can be downloaded directly later.
+        """
+        return images
+
     def download_image(self, image: ChapterImage) -> bytes:
         """Download a chapter image."""
         if image.url.startswith("data:"):
@@ -103,3 +148,112 @@ class Site(ABC):
     def contains(self, url: str) -> bool:
         """Return True if the given manga/chapter url is from this site, False otherwise."""
         return url.startswith(f"{self.url.rstrip('/')}/")
+
+    def new_session(self, headers: Optional[Dict[str, str]] = None) -> Session:
+        """Create a HTTP session with this site's connection settings.
+
+        All the sessions of a site share the same connection pools, but each one
+        has its own cookies and default headers, so it is cheap to create a new
+        session for requests that must not see or modify the state of others.
+        The session must not be closed, that would close the shared pools.
+
+        :param headers: extra default headers for the new session.
+        """
+        session = Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        session.headers.update({"User-Agent": _USER_AGENT, **self.headers})
+        if headers:
+            session.headers.update(headers)
+        session.request = functools.partial(  # type: ignore
+            session.request, timeout=self.timeout
+        )
+        return session
+
+    def _new_adapter(self) -> HTTPAdapter:
+        """Create the transport adapter holding the site's connection pools.
+
+        Connections are kept alive in a pool per host, so the connections to
+        the image servers are reused between requests.
+        """
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        # leave room in the pool for requests that are not throttled like searches
+        return HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=self.max_connections * 2,
+            max_retries=retry,
+        )
+
+    def parse(self, html: str, *args: Any, **kwargs: Any) -> BeautifulSoup:
+        """Parse the given HTML with the fastest parser available.
+
+        If extra arguments are given, only the tags matching them are parsed,
+        the arguments are the same as for ``bs4.SoupStrainer``.
+        """
+        if "class_" in kwargs:
+            kwargs["class_"] = _class_matcher(kwargs["class_"])
+        parse_only = SoupStrainer(*args, **kwargs) if args or kwargs else None
+        return BeautifulSoup(html, _PARSER, parse_only=parse_only)
+
+    def fetch_pages(self, urls: Iterable[str]) -> Iterator[str]:
+        """Fetch the given web pages concurrently and yield their content in order.
+
+        Useful to get all the pages of paginated results, the site's connection
+        limit and politeness delay are respected.
+        """
+
+        def fetch(url: str) -> str:
+            with self.session.get(url) as resp:
+                resp.raise_for_status()
+                return resp.text
+
+        return self.concurrent_map(fetch, urls)
+
+    def concurrent_map(self, func: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+        """Apply the function to the items concurrently, yielding the results in order.
+
+        The function is called holding one of the site's download slots.
+        """
+
+        def throttled(item: T) -> R:
+            with self.throttle():
+                return func(item)
+
+        with ThreadPoolExecutor(max_workers=self.max_connections) as pool:
+            yield from pool.map(throttled, items)
+
+    @contextmanager
+    def throttle(self) -> Iterator[None]:
+        """Wait for a free download slot and hold it until the request is done.
+
+        The slot is released ``request_delay`` seconds after the request finished
+        to avoid hammering the site's servers.
+        """
+        with self._slots:
+            try:
+                yield
+            finally:
+                time.sleep(self.request_delay)
+
+
+def _class_matcher(classes: Union[str, List[str]]) -> Callable[[Any], bool]:
+    """Match CSS classes like ``Tag.find()`` does.
+
+    While parsing, the class attribute is not split yet, so SoupStrainer
+    would only match it as a whole.
+    """
+    if isinstance(classes, str):
+        classes = [classes]
+
+    def match(value: Any) -> bool:
+        if not value:
+            return False
+        values = value.split() if isinstance(value, str) else list(value)
+        return " ".join(values) in classes or any(cls in classes for cls in values)
+
+    return match
@@ -4,7 +4,6 @@ import re
 from typing import Iterable, Set
 
 import json5
-from bs4 import BeautifulSoup
 
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
@@ -25,7 +24,7 @@ class HeavenManga(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/buscar", params={"query": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="c-tabs-item")
         for card in soup("div", {"class": "c-tabs-item"}):
             anchor = card.a
             if not anchor:
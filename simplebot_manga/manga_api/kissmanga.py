@@ -2,8 +2,6 @@
 
 from typing import Iterable, Set
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
@@ -23,7 +21,7 @@ class KissManga(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/search", params={"q": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="mainpage-manga")
         for card in soup("div", {"class": "mainpage-manga"}):
             anchor = card.findNext("div", {"class": "media-body"}).findNext("a")
             yield Manga(
@@ -35,7 +33,7 @@ class KissManga(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="chapter-list")
         soup = soup("div", {"class": "chapter-list"})[1]
         for item in soup("h4"):
             item = item.findNext("a")
@@ -44,7 +42,7 @@ class KissManga(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "p", id="arraydata")
         soup = soup.find("p", {"id": "arraydata"})
         for url in soup.text.split(","):
             yield ChapterImage(url=url)
@@ -3,12 +3,12 @@
 import re
 from typing import Iterable, Set
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
 class MangaBuddy(Site):
+    headers = {"referer": "https://mangabuddy.com"}
+
     @property
     def name(self) -> str:
         return "MangaBuddy"
@@ -24,7 +24,7 @@ class MangaBuddy(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/search", params={"q": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="book-item")
         for card in soup("div", {"class": "book-item"}):
             anchor = card.a
             if anchor is None:
@@ -39,7 +39,7 @@ class MangaBuddy(Site):
         url = f"https://mangabuddy.com/api/manga{manga.url[len(self.url):]}/chapters?source=detail"
         with self.session.get(url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "ul", id="chapter-list")
         soup = soup.find("ul", {"id": "chapter-list"})
         for item in soup("li"):
             item = item.find("a")
@@ -54,14 +54,3 @@ class MangaBuddy(Site):
             if not img.startswith(("https://", "http://")):
                 img = f"https://s1.mbcdnv1.xyz/file/img-mbuddy/manga/{img}"
             yield ChapterImage(url=img)
-
-    def download_image(self, image: ChapterImage) -> bytes:
-        with self.session.get(image.url, headers={"referer": self.url}) as resp:
-            resp.raise_for_status()
-            return resp.content
-
-    def download_cover(self, manga: Manga) -> bytes:
-        assert manga.cover
-        with self.session.get(manga.cover, headers={"referer": self.url}) as resp:
-            resp.raise_for_status()
-            return resp.content
@@ -3,8 +3,6 @@
 from typing import Iterable, Set
 from urllib.parse import quote
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
@@ -24,7 +22,7 @@ class Manganelo(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/search/{quote(query)}") as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="search-story-item")
         for card in soup("div", {"class": "search-story-item"}):
             anchor = card.findNext("a")
             yield Manga(
@@ -36,7 +34,7 @@ class Manganelo(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "li", class_="a-h")
         for item in soup("li", {"class": "a-h"}):
             item = item.findNext("a")
             yield Chapter(
@@ -46,7 +44,7 @@ class Manganelo(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="container-chapter-reader")
         soup = soup.find("div", {"class": "container-chapter-reader"})
         for img in soup("img"):
             yield ChapterImage(url=quote(img["data-src"].strip(), safe=":/%"))
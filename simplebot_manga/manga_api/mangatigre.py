@@ -3,8 +3,6 @@
 from typing import Iterable, Set
 from urllib.parse import quote
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
@@ -24,7 +22,7 @@ class MangaTigre(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(self.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="input-group")
         soup = soup.find("div", {"class": "input-group"})
         token = soup.find("input")["data-csrf"]
         with self.session.post(
@@ -42,11 +40,11 @@ class MangaTigre(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "button", class_="btn-load-more-chapters")
         token = soup.find("button", {"class": "btn-load-more-chapters"})["data-token"]
         with self.session.post(manga.url, data={"_token": token}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "ul", class_="list-unstyled")
         soup = soup.find("ul", {"class": "list-unstyled"})
         for item in soup("li"):
             item = item.findNext("a")
@@ -55,13 +53,13 @@ class MangaTigre(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text)
             btn = soup.find("button", {"data-read-type": 2})
             if btn:
                 data = {"_method": "patch", "_token": btn["data-token"], "read_type": 2}
                 with self.session.post(f"{resp.url}/read-type", data=data) as resp:
                     resp.raise_for_status()
-                    soup = BeautifulSoup(resp.text, "html.parser")
+                    soup = self.parse(resp.text, "div", class_="display-zone")
 
         soup = soup.find("div", {"class": "display-zone"})
         for img in soup("img"):
@@ -1,7 +1,6 @@
 """ManhuaKO site downloader"""
 
-import time
-from typing import Iterable, Set
+from typing import Iterable, Iterator, Set
 from urllib.parse import quote
 
 from bs4 import BeautifulSoup
@@ -25,16 +24,14 @@ class ManhuaKO(Site):
     def search(self, query: str, lang: Language = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/home/search", params={"mq": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text)
         pages = [soup]
         pagelist = soup.find("ul", class_="pagination")
         if pagelist:
             # get only the second page
-            for page in pagelist("a")[1:2]:
-                with self.session.get(page["href"]) as resp:
-                    resp.raise_for_status()
-                    soup = BeautifulSoup(resp.text, "html.parser")
-                pages.append(soup)
+            urls = [page["href"] for page in pagelist("a")[1:2]]
+            for text in self.fetch_pages(urls):
+                pages.append(self.parse(text))
 
         for page in pages:
             for card in page("div", {"class": "card"}):
@@ -50,29 +47,34 @@ class ManhuaKO(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-        pages = [soup]
+            soup = self.parse(
+                resp.text, ["ul", "table"], class_=["pagination", "table-chapters"]
+            )
+        # yield the newest chapters before fetching the other pages, so callers
+        # only interested in the latest chapters can stop early
+        yield from _parse_chapters(soup)
         pagelist = soup.find("ul", class_="pagination")
         if pagelist:
             last_page = int(
                 pagelist("a")[-1]["href"].strip("/").rsplit("/", maxsplit=1)[-1]
             )
-            for page_number in range(2, last_page + 1):
-                with self.session.get(f"{manga.url}/page/{page_number}") as resp:
-                    resp.raise_for_status()
-                    soup = BeautifulSoup(resp.text, "html.parser")
-                pages.append(soup)
-                time.sleep(0.1)
-        for page in pages:
-            page = page.find("table", {"class": "table-chapters"})
-            for item in page("tr"):
-                item = item.findNext("a")
-                yield Chapter(name=item.text.strip(), url=item["href"])
+            urls = [f"{manga.url}/page/{num}" for num in range(2, last_page + 1)]
+            for text in self.fetch_pages(urls):
+                yield from _parse_chapters(
+                    self.parse(text, "table", class_="table-chapters")
+                )
 
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", id="pantallaCompleta")
         soup = soup.find("div", {"id": "pantallaCompleta"})
         for img in soup("img"):
             yield ChapterImage(url=quote(img["src"], safe=":/%"))
+
+
+def _parse_chapters(soup: BeautifulSoup) -> Iterator[Chapter]:
+    page = soup.find("table", {"class": "table-chapters"})
+    for item in page("tr"):
+        item = item.findNext("a")
+        yield Chapter(name=item.text.strip(), url=item["href"])
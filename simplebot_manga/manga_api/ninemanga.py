@@ -1,8 +1,8 @@
 """Nine Manga site downloader"""
 
-from typing import Iterable, Set
+from typing import Iterable, List, Set
 
-from bs4 import BeautifulSoup, Tag
+from bs4 import Tag
 
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
@@ -36,16 +36,15 @@ class NineManga(Site):
 
         with self.session.get(f"{site_url}/search/", params={"wd": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "ul", class_=["direlist", "pagelist"])
 
         pages = [soup.find("ul", class_="direlist")]
         pagelist = soup.find("ul", class_="pagelist")
         if pagelist:
             # get only first few pages:
-            for page in pagelist.find_all("a")[1:-1]:
-                with self.session.get(page["href"]) as resp:
-                    resp.raise_for_status()
-                    soup = BeautifulSoup(resp.text, "html.parser")
+            urls = [page["href"] for page in pagelist.find_all("a")[1:-1]]
+            for text in self.fetch_pages(urls):
+                soup = self.parse(text, "ul", class_="direlist")
                 pages.append(soup.find("ul", class_="direlist"))
 
         for page in pages:
@@ -61,12 +60,12 @@ class NineManga(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_=["warning", "silde"])
         tag = soup.find("div", class_="warning")
         if tag:
             with self.session.get(tag.a["href"]) as resp:
                 resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, "html.parser")
+                soup = self.parse(resp.text, "div", class_="silde")
         tag = soup.find("div", class_="silde")
         for anchor in tag.find_all("a", class_="chapter_list_a"):
             yield Chapter(name=anchor["title"], url=anchor["href"])
@@ -74,32 +73,30 @@ class NineManga(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "select", id="page")
         tag = soup.find("select", id="page")
         site_url = chapter.url[: chapter.url.find("/", 8)]
         for opt in tag.find_all("option"):
             yield ChapterImage(url=f'{site_url}{opt["value"]}')
 
-    def download_image(self, image: ChapterImage) -> bytes:
+    def resolve_images(self, images: List[ChapterImage]) -> List[ChapterImage]:
+        return list(self.concurrent_map(self._resolve_image, images))
+
+    def _resolve_image(self, image: ChapterImage) -> ChapterImage:
         # avoid session cookies, otherwise bad image links are returned
-        cookies = self.session.cookies.copy()
-        self.session.cookies.clear()
-        headers = {
-            "Accept-Language": "en-US,en;q=0.5",
-            "Accept": (
-                "text/html,application/xhtml+xml,application/xml;q=0.9,"
-                "image/avif,image/webp,*/*;q=0.8"
-            ),
-        }
-        try:
-            with self.session.get(image.url, headers=headers) as resp:
-                resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, "html.parser")
-            with self.session.get(soup.find("img", class_="manga_pic")["src"]) as resp:
-                resp.raise_for_status()
-                return resp.content
-        finally:  # restore cookies
-            self.session.cookies = cookies
+        session = self.new_session(
+            {
+                "Accept-Language": "en-US,en;q=0.5",
+                "Accept": (
+                    "text/html,application/xhtml+xml,application/xml;q=0.9,"
+                    "image/avif,image/webp,*/*;q=0.8"
+                ),
+            }
+        )
+        with session.get(image.url) as resp:
+            resp.raise_for_status()
+            soup = self.parse(resp.text, "img", class_="manga_pic")
+        return ChapterImage(url=soup.find("img", class_="manga_pic")["src"])
 
     def contains(self, url: str) -> bool:
         for lang in self.supported_languages:
@@ -3,8 +3,6 @@
 from typing import Iterable, Set
 from urllib.parse import quote
 
-from bs4 import BeautifulSoup
-
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
 
@@ -32,7 +30,7 @@ class TuMangaOnline(Site):
             f"{self.url}/library", params={"_pg": "1", "title": query}
         ) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="element")
         for card in soup("div", {"class": "element"}):
             name = (
                 card.findNext("div", {"class": "thumbnail-title"}).h4["title"].strip()
@@ -46,7 +44,7 @@ class TuMangaOnline(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", id="chapters")
         soup = soup.find("div", {"id": "chapters"})
         for item in soup.select("li.list-group-item.upload-link"):
             name = item.findNext("a").text.strip().replace("\xa0", " ")
@@ -60,13 +58,13 @@ class TuMangaOnline(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text)
 
         cascade = soup.find("a", {"title": "Cascada"})
         if cascade:
             with self.session.get(cascade["href"]) as resp:
                 resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, "html.parser")
+                soup = self.parse(resp.text, "div", class_="viewer-container container")
 
         soup = soup.find("div", {"class": "viewer-container container"})
         for img in soup("img"):
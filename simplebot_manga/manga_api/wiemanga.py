@@ -1,8 +1,6 @@
 """Wie Manga site downloader"""
 
-from typing import Iterable, Optional, Set
-
-from bs4 import BeautifulSoup
+from typing import Iterable, List, Optional, Set
 
 from .base import Chapter, ChapterImage, Language, Manga, Site
 
@@ -23,7 +21,7 @@ class WieManga(Site):
     def search(self, query: str, lang: Optional[Language] = None) -> Iterable[Manga]:
         with self.session.get(f"{self.url}/search/", params={"wd": query}) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="searchresult")
         soup = soup.find("div", {"class": "searchresult"})
         for anchor in soup("a", {"class": "resultimg"}):
             img = anchor.img
@@ -36,7 +34,7 @@ class WieManga(Site):
     def get_chapters(self, manga: Manga) -> Iterable[Chapter]:
         with self.session.get(manga.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "div", class_="chapterlist")
         soup = soup.find("div", {"class": "chapterlist"})
         for item in soup("td", {"class": "col1"}):
             item = item.a
@@ -45,15 +43,16 @@ class WieManga(Site):
     def get_images(self, chapter: Chapter) -> Iterable[ChapterImage]:
         with self.session.get(chapter.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = self.parse(resp.text, "select", id="page")
         soup = soup.find("select", id="page")
         for opt in soup("option"):
             yield ChapterImage(url=opt["value"])
 
-    def download_image(self, image: ChapterImage) -> bytes:
+    def resolve_images(self, images: List[ChapterImage]) -> List[ChapterImage]:
+        return list(self.concurrent_map(self._resolve_image, images))
+
+    def _resolve_image(self, image: ChapterImage) -> ChapterImage:
         with self.session.get(image.url) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-        with self.session.get(soup.find("img", id="comicpic")["src"]) as resp:
-            resp.raise_for_status()
-            return resp.content
+            soup = self.parse(resp.text, "img", id="comicpic")
+        return ChapterImage(url=soup.find("img", id="comicpic")["src"])
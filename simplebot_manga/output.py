@@ -0,0 +1,211 @@
+"""Chapter output formats"""
+
+import base64
+import math
+import os
+import zipfile
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import List, Tuple
+
+from .pdf import PdfWriter
+from .util import get_image_format, jpeg_info
+
+Page = Tuple[BytesIO, int, int]
+
+
+class ChapterPart(ABC):
+    """A chapter part being assembled in the given directory."""
+
+    #: name of the part's file
+    filename = ""
+    #: estimated size in bytes of a part without pages
+    base_size = 0
+    #: whether the pages must be converted to JPEG
+    convert = True
+
+    def __init__(self, dirname: str) -> None:
+        self.dirname = dirname
+        self.path = os.path.join(dirname, self.filename)
+
+    @abstractmethod
+    def add(self, page: Page) -> None:
+        """Add a page to the part, the page's file is closed."""
+
+    @abstractmethod
+    def close(self, title: str) -> str:
+        """Finish the part and return the path of the resulting file."""
+
+    @staticmethod
+    @abstractmethod
+    def page_size(img_size: int) -> int:
+        """Estimate how many bytes a page with an image of the given size adds."""
+
+    @staticmethod
+    def reply_args(path: str) -> dict:
+        """Get the arguments for ``Replies.add()`` to send the given part's file."""
+        return {"filename": path}
+
+
+class PdfPart(ChapterPart):
+    filename = "chapter.pdf"
+    # header, trailer and document info with the title
+    base_size = 2048
+
+    def __init__(self, dirname: str) -> None:
+        super().__init__(dirname)
+        self._file = open(self.path, "wb")  # noqa
+        self._pdf = PdfWriter(self._file)
+
+    def add(self, page: Page) -> None:
+        img_file, width, height = page
+        with img_file:
+            jpeg = img_file.getvalue()
+        info = jpeg_info(jpeg)
+        colorspace = "DeviceGray" if info and info.components == 1 else "DeviceRGB"
+        self._pdf.add_page(jpeg, width, height, colorspace)
+
+    def close(self, title: str) -> str:
+        with self._file:
+            self._pdf.close(title)
+        return self.path
+
+    @staticmethod
+    def page_size(img_size: int) -> int:
+        # the image, content stream and page objects plus their xref entries
+        return img_size + 512
+
+
+class HtmlPart(ChapterPart):
+    filename = "chapter.html"
+    base_size = 256
+
+    #: size of the chunks encoded at once, multiple of 3 so the base64 chunks
+    #: can be joined without padding
+    chunk_size = 3 * 1024 * 64
+
+    def __init__(self, dirname: str) -> None:
+        super().__init__(dirname)
+        self._file = open(self.path, "wb")  # noqa
+        self._file.write(
+            b'<!DOCTYPE html><html><meta charset="UTF-8">'
+            b'<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+            b"<style>html,body{padding:0;margin:0;}img{width:100%;height:auto;}</style>"
+            b"</head><body>"
+        )
+
+    def add(self, page: Page) -> None:
+        img_file = page[0]
+        with img_file, img_file.getbuffer() as data:
+            self._file.write(b'<img src="data:image/jpeg;base64,')
+            for start in range(0, len(data), self.chunk_size):
+                self._file.write(
+                    base64.b64encode(data[start : start + self.chunk_size])
+                )
+            self._file.write(b'"/>')
+
+    def close(self, title: str) -> str:
+        with self._file:
+            self._file.write(b"</body></html>")
+        return self.path
+
+    @staticmethod
+    def page_size(img_size: int) -> int:
+        return (img_size + 2) // 3 * 4 + 64
+
+
+class CbzPart(ChapterPart):
+    """Comic book archive with the original images, without compression."""
+
+    filename = "chapter.cbz"
+    # end of central directory record with the title as comment
+    base_size = 1024
+    convert = False
+
+    def __init__(self, dirname: str) -> None:
+        super().__init__(dirname)
+        self._file = open(self.path, "wb")  # noqa
+        self._zip = zipfile.ZipFile(self._file, "w", compression=zipfile.ZIP_STORED)
+        self._count = 0
+
+    def add(self, page: Page) -> None:
+        img_file = page[0]
+        with img_file:
+            data = img_file.getvalue()
+        self._count += 1
+        name = f"{self._count:04}.{get_image_format(data) or 'jpg'}"
+        self._zip.writestr(name, data)
+
+    def close(self, title: str) -> str:
+        with self._file:
+            self._zip.comment = title.encode()[:0xFFFF]
+            self._zip.close()
+        return self.path
+
+    @staticmethod
+    def page_size(img_size: int) -> int:
+        # local file header and central directory entry
+        return img_size + 128
+
+
+def split_pages(sizes: List[int], max_size: int, base_size: int) -> List[List[int]]:
+    """Split the pages in the fewest parts not bigger than ``max_size``.
+
+    The pages are distributed so the parts have similar sizes, keeping their
+    order. Pages bigger than the limit get a part of their own.
+
+    :param sizes: the estimated size of each page in the part.
+    :param base_size: the estimated size of a part without pages.
+    :return: the indexes of the pages of each part.
+    """
+    capacity = max(max_size - base_size, 1)
+    count = len(_pack(sizes, capacity))
+    parts = _split_evenly(sizes, capacity, count)
+    if len(parts) == count:
+        return parts
+    # the cuts closest to the ideal ones made a part too big, find the
+    # smallest capacity that doesn't need more parts instead
+    low, high = math.ceil(sum(sizes) / count), capacity
+    while low < high:
+        middle = (low + high) // 2
+        if len(_pack(sizes, middle)) <= count:
+            high = middle
+        else:
+            low = middle + 1
+    return _pack(sizes, max(high, 1))
+
+
+def _split_evenly(sizes: List[int], capacity: int, count: int) -> List[List[int]]:
+    """Cut the pages where the accumulated size is closest to ``k*total/count``.
+
+    Return an empty list if the parts don't fit in ``capacity``.
+    """
+    total = sum(sizes)
+    parts: List[List[int]] = [[]]
+    part_size = done = 0
+    for i, size in enumerate(sizes):
+        target = total * len(parts) / count
+        if parts[-1] and (
+            part_size + size > capacity
+            or abs(done + size - target) > abs(done - target)
+        ):
+            if len(parts) == count:
+                return []
+            parts.append([])
+            part_size = 0
+        parts[-1].append(i)
+        part_size += size
+        done += size
+    return parts
+
+
+def _pack(sizes: List[int], capacity: int) -> List[List[int]]:
+    parts: List[List[int]] = [[]]
+    total = 0
+    for i, size in enumerate(sizes):
+        if parts[-1] and total + size > capacity:
+            parts.append([])
+            total = 0
+        parts[-1].append(i)
+        total += size
+    return parts
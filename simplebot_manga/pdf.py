@@ -0,0 +1,86 @@
+"""Minimal streaming PDF writer"""
+
+from typing import BinaryIO, List, Optional
+
+
+class PdfWriter:
+    """Write a PDF document with a JPEG image per page.
+
+    Every page is written to the output file as soon as it is added and the
+    JPEG data is embedded as-is (DCTDecode filter) without decoding it, so
+    memory usage doesn't depend on the number of pages.
+    """
+
+    _CATALOG = 1
+    _PAGES = 2
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        self.size = 0
+        self._offsets: List[int] = [0, 0]  # catalog and pages root are written last
+        self._pages: List[int] = []
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_page(
+        self, jpeg: bytes, width: int, height: int, colorspace: str = "DeviceRGB"
+    ) -> None:
+        """Add a page with the given JPEG image, the page has the image's size."""
+        image = self._new_obj()
+        self._write_obj(
+            image,
+            b"<</Type/XObject/Subtype/Image/Width %d/Height %d/ColorSpace/%s"
+            b"/BitsPerComponent 8/Filter/DCTDecode/Length %d>>"
+            % (width, height, colorspace.encode(), len(jpeg)),
+            jpeg,
+        )
+        content = b"q %d 0 0 %d 0 0 cm /I0 Do Q" % (width, height)
+        contents = self._new_obj()
+        self._write_obj(contents, b"<</Length %d>>" % len(content), content)
+        page = self._new_obj()
+        self._write_obj(
+            page,
+            b"<</Type/Page/Parent %d 0 R/MediaBox[0 0 %d %d]"
+            b"/Resources<</XObject<</I0 %d 0 R>>>>/Contents %d 0 R>>"
+            % (self._PAGES, width, height, image, contents),
+        )
+        self._pages.append(page)
+
+    def close(self, title: str = "") -> None:
+        """Write the document's trailer, the output file is not closed."""
+        kids = b" ".join(b"%d 0 R" % page for page in self._pages)
+        self._write_obj(
+            self._PAGES,
+            b"<</Type/Pages/Kids[%s]/Count %d>>" % (kids, len(self._pages)),
+        )
+        self._write_obj(self._CATALOG, b"<</Type/Catalog/Pages %d 0 R>>" % self._PAGES)
+        info = self._new_obj()
+        self._write_obj(
+            info, b"<</Title<FEFF%s>>>" % title.encode("utf-16-be").hex().encode()
+        )
+
+        xref = self.size
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        for offset in self._offsets:
+            self._write(b"%010d 00000 n \n" % offset)
+        self._write(
+            b"trailer\n<</Size %d/Root %d 0 R/Info %d 0 R>>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets) + 1, self._CATALOG, info, xref)
+        )
+
+    def _new_obj(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _write_obj(self, num: int, obj: bytes, stream: Optional[bytes] = None) -> None:
+        self._offsets[num - 1] = self.size
+        self._write(b"%d 0 obj\n" % num)
+        self._write(obj)
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.size += len(data)
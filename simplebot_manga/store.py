@@ -0,0 +1,121 @@
+"""SQLite-backed cache"""
+
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from cachelib import BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Cache storing all the values in a single SQLite database.
+
+    It has the same semantics as the ``cachelib`` caches, a timeout of 0 means
+    the value never expires. Expired values are removed a few at a time on
+    every write.
+    """
+
+    #: maximum number of expired rows deleted on each write
+    prune_limit = 100
+
+    def __init__(self, path: str, default_timeout: int = 300) -> None:
+        super().__init__(default_timeout)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache"
+            " (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+
+    def get(self, key: str) -> Any:
+        return self.get_many(key)[0]
+
+    def get_many(self, *keys: str) -> List[Any]:
+        values: Dict[str, Any] = {}
+        with self._lock:
+            for key in keys:
+                row = self._db.execute(
+                    "SELECT value FROM cache"
+                    " WHERE key=? AND (expires IS NULL OR expires>?)",
+                    (key, time.time()),
+                ).fetchone()
+                if row:
+                    values[key] = pickle.loads(row[0])
+        return [values.get(key) for key in keys]
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM cache WHERE key=? AND (expires IS NULL OR expires>?)",
+                (key, time.time()),
+            ).fetchone()
+        return row is not None
+
+    def set(
+        self, key: str, value: Any, timeout: Optional[Union[int, timedelta]] = None
+    ) -> bool:
+        return bool(self.set_many({key: value}, timeout))
+
+    def set_many(
+        self, mapping: Dict[str, Any], timeout: Optional[Union[int, timedelta]] = None
+    ) -> List[Any]:
+        """Set all the values in a single transaction."""
+        expires = self._get_expiration(timeout)
+        rows = [
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in mapping.items()
+        ]
+        try:
+            with self._lock, self._db:
+                self._db.executemany("REPLACE INTO cache VALUES (?,?,?)", rows)
+                self._prune()
+        except sqlite3.Error:
+            logging.warning("Failed to save values in cache", exc_info=True)
+            return []
+        return list(mapping.keys())
+
+    def add(
+        self, key: str, value: Any, timeout: Optional[Union[int, timedelta]] = None
+    ) -> bool:
+        row = (
+            key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self._get_expiration(timeout),
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM cache WHERE key=? AND expires<=?", (key, time.time())
+            )
+            cur = self._db.execute("INSERT OR IGNORE INTO cache VALUES (?,?,?)", row)
+            self._prune()
+        return cur.rowcount == 1
+
+    def delete(self, key: str) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM cache WHERE key=?", (key,))
+        return cur.rowcount == 1
+
+    def clear(self) -> bool:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cache")
+        return True
+
+    def _get_expiration(
+        self, timeout: Optional[Union[int, timedelta]]
+    ) -> Optional[float]:
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else None
+
+    def _prune(self) -> None:
+        self._db.execute(
+            "DELETE FROM cache WHERE rowid IN"
+            " (SELECT rowid FROM cache WHERE expires<=? LIMIT ?)",
+            (time.time(), self.prune_limit),
+        )
@@ -0,0 +1,116 @@
+"""Users' subscriptions to mangas"""
+
+import json
+import sqlite3
+import threading
+from typing import List, Tuple
+
+
+class Subscriptions:
+    """Database of the mangas followed by the users.
+
+    Each manga is stored once no matter how many subscribers it has, together
+    with the URLs of its known chapters and the time of its next check.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS mangas (url TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL, chapters TEXT NOT NULL, next_check REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS mangas_next_check ON mangas (next_check)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions"
+                " (addr TEXT, manga TEXT, PRIMARY KEY (addr, manga))"
+            )
+
+    def subscribe(
+        self, addr: str, url: str, name: str, chapters: List[str], next_check: float
+    ) -> bool:
+        """Subscribe the user to the given manga.
+
+        The chapters and next check time are only used if the manga had no
+        subscribers. Return False if the user was already subscribed.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO mangas VALUES (?,?,?,?)",
+                (url, name, json.dumps(chapters), next_check),
+            )
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO subscriptions VALUES (?,?)", (addr, url)
+            )
+        return cur.rowcount == 1
+
+    def unsubscribe(self, addr: str, url: str) -> bool:
+        """Return False if the user was not subscribed to the given manga."""
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "DELETE FROM subscriptions WHERE addr=? AND manga=?", (addr, url)
+            )
+            self._db.execute(
+                "DELETE FROM mangas WHERE url=? AND NOT EXISTS"
+                " (SELECT 1 FROM subscriptions WHERE manga=?)",
+                (url, url),
+            )
+        return cur.rowcount == 1
+
+    def is_subscribed(self, addr: str, url: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM subscriptions WHERE addr=? AND manga=?", (addr, url)
+            ).fetchone()
+        return row is not None
+
+    def get_mangas(self, addr: str) -> List[Tuple[str, str]]:
+        """Get the URL and name of the mangas the user is subscribed to."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, name FROM mangas JOIN subscriptions ON url=manga"
+                " WHERE addr=? ORDER BY name",
+                (addr,),
+            ).fetchall()
+
+    def get_subscribers(self, url: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT addr FROM subscriptions WHERE manga=?", (url,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_due(self, now: float) -> List[Tuple[str, str]]:
+        """Get the URL and name of the mangas to check, the most overdue first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, name FROM mangas WHERE next_check<=? ORDER BY next_check",
+                (now,),
+            ).fetchall()
+
+    def get_chapters(self, url: str) -> List[str]:
+        """Get the URLs of the known chapters of the given manga."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT chapters FROM mangas WHERE url=?", (url,)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def update(self, url: str, chapters: List[str], next_check: float) -> None:
+        """Save the known chapters of the given manga and its next check time."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE mangas SET chapters=?, next_check=? WHERE url=?",
+                (json.dumps(chapters), next_check, url),
+            )
+
+    def postpone(self, url: str, next_check: float) -> None:
+        """Set the next check time of the given manga."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE mangas SET next_check=? WHERE url=?", (next_check, url)
+            )
@@ -1,12 +1,199 @@
 """Utilities"""
 
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from datetime import date
 from io import BytesIO
-from typing import Iterable, Optional, Tuple
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from fpdf import FPDF
-from PIL import Image
+from PIL import Image, ImageChops
 from simplebot.bot import DeltaBot
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+# JPEG "start of frame" markers, excluding DHT, JPG and DAC
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# baseline and extended sequential huffman-coded frames
+_SEQUENTIAL_SOF_MARKERS = {0xC0, 0xC1}
+# lowest JPEG quality used to fit images in a size limit
+_MIN_QUALITY = 20
+# images taller than this times their width are sliced in pages
+_MAX_PAGE_RATIO = 3
+# ideal height of the slices relative to their width
+_PAGE_RATIO = 2
+# maximum mean difference between adjacent pixels of a blank row
+_GUTTER_THRESHOLD = 3
+# sum of the libjpeg luminance quantization table at quality 50
+_STD_LUMA_SUM = sum(
+    (
+        *(16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55),
+        *(14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62),
+        *(18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92),
+        *(49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99),
+    )
+)
+
+
+class JpegInfo(NamedTuple):
+    width: int
+    height: int
+    components: int
+    sequential: bool
+    #: estimated libjpeg quality, 0 if unknown
+    quality: int = 0
+
+
+class ImageProfile(NamedTuple):
+    """Settings of the images sent to the user."""
+
+    #: maximum width in pixels of the images, 0 for no limit
+    max_width: int = 0
+    #: JPEG quality of re-encoded images
+    quality: int = 75
+    grayscale: bool = False
+    #: size in bytes that images should not exceed if possible, 0 for no limit
+    max_size: int = 0
+
+    @property
+    def key(self) -> str:
+        """Short string identifying the profile, to use in cache keys."""
+        return f"w{self.max_width}q{self.quality}g{int(self.grayscale)}s{self.max_size}"
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key.
+
+    While a call is in progress, other callers with the same key wait for it
+    to finish and get its result (or exception) instead of repeating the work.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "_Call"] = {}
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        return self._run(key, call, func)
+
+    def start(self, key: Hashable, func: Callable[[], Any], executor: Executor) -> None:
+        """Run the call in background, unless one with the same key is in progress.
+
+        Calls to ``do()`` with the same key made meanwhile wait for its result,
+        errors are logged.
+        """
+        with self._lock:
+            if key in self._calls:
+                return
+            call = self._calls[key] = _Call()
+        future = executor.submit(self._run, key, call, func)
+        future.add_done_callback(_log_error)
+
+    def _run(self, key: Hashable, call: "_Call", func: Callable[[], T]) -> T:
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _log_error(future: Future) -> None:
+    if not future.cancelled() and future.exception():
+        logging.warning("Background call failed", exc_info=future.exception())
+
+
+class TokenBucket:
+    """Limit the average usage of a resource, like bandwidth, to ``rate`` units
+    per second, allowing bursts of up to ``burst`` units.
+
+    The usage is reported after the fact, so a caller that overdraws the bucket
+    waits for it to be refilled.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: float) -> None:
+        """Take the given amount of units, blocking while the bucket is overdrawn."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= amount
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        time.sleep(delay)
+
+
+class DailyQuota:
+    """Usage counter of a resource with a daily limit."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._day = date.today()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount: int) -> None:
+        with self._lock:
+            self._reset()
+            self._used += amount
+
+    def exceeded(self) -> bool:
+        with self._lock:
+            self._reset()
+            return self._used >= self.limit
+
+    def _reset(self) -> None:
+        if self._day != date.today():
+            self._day = date.today()
+            self._used = 0
+
 
 def getdefault(bot: DeltaBot, key: str, value: Optional[str] = None) -> str:
     scope = __name__.split(".", maxsplit=1)[0]
@@ -17,29 +204,222 @@ def getdefault(bot: DeltaBot, key: str, value: Optional[str] = None) -> str:
     return val
 
 
-def convert_image(img_bytes: bytes) -> Tuple[BytesIO, int, int]:
-    img = Image.open(BytesIO(img_bytes))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-    width, height = img.width, img.height
+def ordered_map(
+    func: Callable[[T], R], items: Iterable[T], executor: Executor, prefetch: int
+) -> Iterator[R]:
+    """Like ``executor.map()`` but lazy: at most ``prefetch`` items are in flight
+    at any time and the results are yielded in the same order as ``items``."""
+    items = iter(items)
+    futures: Deque[Future] = deque(
+        executor.submit(func, item) for item in islice(items, prefetch)
+    )
+    try:
+        while futures:
+            future = futures.popleft()
+            for item in islice(items, 1):
+                futures.append(executor.submit(func, item))
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
 
-    img_file = BytesIO()
+
+def jpeg_info(data: bytes) -> Optional[JpegInfo]:
+    """Get the JPEG image's size and encoding from its header without decoding it.
+
+    Return None if the data is not a JPEG image.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    quality = 0
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # markers without payload
+            pos += 2
+            continue
+        if marker == 0xDA:  # start of scan before frame header
+            return None
+        if marker in _SOF_MARKERS:
+            if pos + 10 > len(data):
+                return None
+            height = int.from_bytes(data[pos + 5 : pos + 7], "big")
+            width = int.from_bytes(data[pos + 7 : pos + 9], "big")
+            if not width or not height:
+                return None
+            return JpegInfo(
+                width,
+                height,
+                data[pos + 9],
+                marker in _SEQUENTIAL_SOF_MARKERS,
+                quality,
+            )
+        length = int.from_bytes(data[pos + 2 : pos + 4], "big")
+        if marker == 0xDB:  # quantization tables
+            quality = _estimate_quality(data[pos + 4 : pos + 2 + length]) or quality
+        pos += 2 + length
+    return None
+
+
+def _estimate_quality(segment: bytes) -> int:
+    """Estimate the libjpeg quality of the luminance table in the DQT segment.
+
+    Return 0 if the segment doesn't have the luminance table.
+    """
+    pos = 0
+    while pos < len(segment):
+        wide, table_id = segment[pos] >> 4, segment[pos] & 0x0F
+        size = 128 if wide else 64
+        table = segment[pos + 1 : pos + 1 + size]
+        if len(table) < size:
+            return 0
+        if table_id == 0:
+            if wide:
+                total = sum(
+                    int.from_bytes(table[i : i + 2], "big") for i in range(0, size, 2)
+                )
+            else:
+                total = sum(table)
+            # libjpeg scales the standard table by 5000/q below 50, 200-2q above
+            scale = total * 100 / _STD_LUMA_SUM
+            if scale <= 100:
+                quality = round((200 - scale) / 2)
+            else:
+                quality = round(5000 / scale)
+            return min(max(quality, 1), 100)
+        pos += 1 + size
+    return 0
+
+
+def get_image_format(data: bytes) -> Optional[str]:
+    """Get the file extension of the image if it is in a format supported by
+    comic book readers (JPEG, PNG, GIF or WebP), otherwise return None."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def get_raw_page(img_bytes: bytes) -> Optional[Tuple[BytesIO, int, int]]:
+    """Get the image as a page without converting it.
+
+    Return None if the image is not in a format supported by comic book readers.
+    """
+    if not get_image_format(img_bytes):
+        return None
+    with Image.open(BytesIO(img_bytes)) as img:  # only the header is read
+        width, height = img.size
+    return BytesIO(img_bytes), width, height
+
+
+def convert_image(
+    img_bytes: bytes, profile: ImageProfile = ImageProfile()
+) -> List[Tuple[BytesIO, int, int]]:
+    """Convert the image to JPEG pages following the given profile.
+
+    Very tall images, like webtoon strips, are sliced in several pages, cutting
+    them at blank rows if possible. If the profile has a size limit, the
+    highest quality up to the profile's quality that fits in the limit is used.
+    """
+    info = jpeg_info(img_bytes)
+    if (
+        info
+        and info.sequential
+        and info.components in ((1,) if profile.grayscale else (1, 3))
+        and (not profile.max_width or info.width <= profile.max_width)
+        and (not profile.max_size or len(img_bytes) <= profile.max_size)
+        and info.height <= info.width * _MAX_PAGE_RATIO
+        and 0 < info.quality <= profile.quality
+    ):
+        # already a JPEG that any reader can display, re-encoding it at the
+        # profile's quality would only lose detail
+        return [(BytesIO(img_bytes), info.width, info.height)]
+
+    img: Image.Image = Image.open(BytesIO(img_bytes))
     try:
-        img.save(img_file, format="JPEG")
-        img_file.seek(0)
+        mode = "L" if profile.grayscale else "RGB"
+        if img.mode != mode:
+            img = img.convert(mode)
+        if profile.max_width and img.width > profile.max_width:
+            height = max(round(img.height * profile.max_width / img.width), 1)
+            img = img.resize((profile.max_width, height), Image.LANCZOS)
+
+        pages = []
+        for top, bottom in _get_slices(img):
+            page = img.crop((0, top, img.width, bottom))
+            pages.append((_encode_fit(page, profile), page.width, page.height))
+        return pages
     finally:
         img.close()
 
-    return img_file, width, height
 
+def _get_slices(img: Image.Image) -> List[Tuple[int, int]]:
+    """Get the vertical ranges of the pages the image should be sliced into.
+
+    Pages are cut at the blank row closest to the ideal page height, or at the
+    most uniform row if there are no blank rows.
+    """
+    width, height = img.size
+    if width < 2 or height <= width * _MAX_PAGE_RATIO:
+        return [(0, height)]
+
+    # mean difference between horizontally adjacent pixels of each row,
+    # computed by Pillow in C: resizing to 1px width averages the rows
+    gray = img.convert("L")
+    left = gray.crop((0, 0, width - 1, height))
+    right = gray.crop((1, 0, width, height))
+    edges = ImageChops.difference(left, right)
+    rows = list(edges.resize((1, height), Image.BOX).getdata())
+    for image in (gray, left, right, edges):
+        image.close()
+
+    slices = []
+    top = 0
+    while height - top > width * _MAX_PAGE_RATIO:
+        ideal = top + width * _PAGE_RATIO
+        # never leave less than a square page for the rest of the image
+        candidates = range(
+            top + width, min(top + width * _MAX_PAGE_RATIO, height - width)
+        )
+        gutters = [row for row in candidates if rows[row] <= _GUTTER_THRESHOLD]
+        if gutters:
+            cut = min(gutters, key=lambda row: abs(row - ideal))
+        else:
+            cut = min(candidates, key=lambda row: (rows[row], abs(row - ideal)))
+        slices.append((top, cut))
+        top = cut
+    slices.append((top, height))
+    return slices
 
-def images2pdf(images: Iterable[Tuple[BytesIO, int, int]], title: str) -> BytesIO:
-    pdf = FPDF("P", "pt")
-    for img_file, width, height in images:
-        pdf.add_page(format=(width, height))
-        pdf.image(img_file, 0, 0, width, height)
-        img_file.close()
 
-    pdf.set_title(title)
-    output = pdf.output()
-    return BytesIO(output)
+def _encode_fit(img: Image.Image, profile: ImageProfile) -> BytesIO:
+    img_file = _encode(img, profile.quality)
+    if profile.max_size and img_file.getbuffer().nbytes > profile.max_size:
+        # binary search of the best quality that fits in the size limit
+        low, high = _MIN_QUALITY, profile.quality - 1
+        img_file = _encode(img, low)
+        while low < high:
+            quality = (low + high + 1) // 2
+            candidate = _encode(img, quality)
+            if candidate.getbuffer().nbytes <= profile.max_size:
+                img_file, low = candidate, quality
+            else:
+                high = quality - 1
+    return img_file
+
+
+def _encode(img: Image.Image, quality: int) -> BytesIO:
+    img_file = BytesIO()
+    img.save(img_file, format="JPEG", quality=quality)
+    img_file.seek(0)
+    return img_file
@@ -0,0 +1,89 @@
+import os
+import random
+import zipfile
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from simplebot_manga.output import CbzPart, HtmlPart, PdfPart, _pack, split_pages
+
+
+def _jpeg(width: int, height: int, gray: bool = False) -> bytes:
+    img = Image.effect_noise((width, height), 64)
+    if not gray:
+        img = img.convert("RGB")
+    img_file = BytesIO()
+    img.save(img_file, "JPEG", quality=75)
+    return img_file.getvalue()
+
+
+def test_split_pages_evenly() -> None:
+    parts = split_pages([10] * 10, 35, 0)
+    assert len(parts) == 4
+    assert sorted(len(part) for part in parts) == [2, 2, 3, 3]
+
+
+def test_split_pages_base_size() -> None:
+    assert split_pages([10] * 4, 45, 5) == [[0, 1, 2, 3]]
+    assert len(split_pages([10] * 4, 44, 5)) == 2
+
+
+def test_split_pages_oversized_page() -> None:
+    assert split_pages([50, 1, 1], 10, 0) == [[0], [1, 2]]
+    assert split_pages([1, 50, 1], 10, 0) == [[0], [1], [2]]
+
+
+def test_split_pages_empty() -> None:
+    assert split_pages([], 10, 0) == [[]]
+
+
+def test_split_pages_random() -> None:
+    rand = random.Random(0)
+    for _ in range(2000):
+        sizes = [rand.randint(1, 50) for _ in range(rand.randint(1, 30))]
+        max_size = rand.randint(1, 200)
+        base_size = rand.randint(0, 20)
+        capacity = max(max_size - base_size, 1)
+
+        parts = split_pages(sizes, max_size, base_size)
+
+        # all the pages in order, no empty parts
+        assert [i for part in parts for i in part] == list(range(len(sizes)))
+        assert all(parts)
+        # the fewest parts possible, the greedy packing is optimal
+        assert len(parts) == len(_pack(sizes, capacity))
+        # only single pages can exceed the limit
+        for part in parts:
+            assert len(part) == 1 or sum(sizes[i] for i in part) <= capacity
+
+
+@pytest.mark.parametrize("part_class", [PdfPart, HtmlPart, CbzPart])
+def test_part_size_estimate(part_class, tmp_path) -> None:
+    """The planned size of a part is never smaller than the real one."""
+    # many small pages so the per-page overhead dominates
+    images = [_jpeg(1, 1), _jpeg(10, 10, gray=True)] * 20 + [_jpeg(800, 1200)]
+    part = part_class(str(tmp_path))
+    for img in images:
+        with Image.open(BytesIO(img)) as image:
+            part.add((BytesIO(img), *image.size))
+    path = part.close("Some Manga - Chapter 10: The Title ✨")
+
+    estimate = part_class.base_size + sum(
+        part_class.page_size(len(img)) for img in images
+    )
+    assert os.path.getsize(path) <= estimate
+
+
+def test_cbz_part(tmp_path) -> None:
+    images = [_jpeg(100, 150), _jpeg(150, 100)]
+    part = CbzPart(str(tmp_path))
+    for img in images:
+        part.add((BytesIO(img), 0, 0))
+    path = part.close("Title")
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert archive.comment == b"Title"
+        assert archive.namelist() == ["0001.jpg", "0002.jpg"]
+        assert [archive.read(name) for name in archive.namelist()] == images
@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from PIL import Image
+from pypdf import PdfReader
+
+from simplebot_manga.pdf import PdfWriter
+
+
+def _jpeg(width: int, height: int, mode: str = "RGB") -> bytes:
+    img_file = BytesIO()
+    Image.new(mode, (width, height), "white").save(img_file, "JPEG")
+    return img_file.getvalue()
+
+
+def test_pdf_writer() -> None:
+    images = [(_jpeg(100, 150), 100, 150), (_jpeg(300, 200, "L"), 300, 200)]
+    output = BytesIO()
+    pdf = PdfWriter(output)
+    pdf.add_page(*images[0])
+    pdf.add_page(*images[1], colorspace="DeviceGray")
+    pdf.close("Chapter 1: ñ ✨")
+    assert pdf.size == len(output.getvalue())
+
+    reader = PdfReader(BytesIO(output.getvalue()), strict=True)
+    assert reader.metadata.title == "Chapter 1: ñ ✨"
+    assert len(reader.pages) == 2
+    for page, (jpeg, width, height) in zip(reader.pages, images):
+        assert (page.mediabox.width, page.mediabox.height) == (width, height)
+        image = page["/Resources"]["/XObject"]["/I0"].get_object()
+        assert image.get_data() == jpeg
+
+
+def test_empty_pdf() -> None:
+    output = BytesIO()
+    pdf = PdfWriter(output)
+    pdf.close()
+
+    reader = PdfReader(BytesIO(output.getvalue()), strict=True)
+    assert len(reader.pages) == 0